@@ -4,6 +4,10 @@ SERVER_PORT = 7734
 VERSION = "P2P-CI/1.0"
 RFC_DIR = "rfc"
 
+# Request methods accepted on each protocol (sets for O(1) membership tests)
+P2S_METHODS = frozenset(("ADD", "ADDMANY", "LOOKUP", "LIST"))
+P2P_METHODS = frozenset(("GET",))
+
 STATUS_CODES = {
     200: "OK",
     400: "Bad Request",
@@ -1,101 +1,346 @@
 # Peer application for P2P-CI
 # Runs upload server, connects to central server, downloads RFCs from other peers
 
+import errno
+import logging
+import mmap
+import re
 import socket
+import selectors
 import threading
 import os
 import argparse
-from datetime import datetime
+from email.utils import formatdate
 from config import SERVER_PORT, VERSION, RFC_DIR
 from protocol import (
-    build_add_request, build_lookup_request, build_list_request,
-    build_get_request, build_get_response,
+    build_add_request, build_addmany_request, build_lookup_request,
+    build_list_request, build_get_request, build_get_response_header,
+    build_get_error_response,
     parse_p2s_response, parse_p2p_request, parse_p2p_response,
     get_os_info, CRLF
 )
 
+# Upload-side request logging; debug records are only emitted with --verbose
+logger = logging.getLogger('p2pci')
+
+# Local RFC file names: rfc<number>.txt
+_RFC_RE = re.compile(r'^rfc(\d+)\.txt$')
+
+
+def _recv_more(sock, buf, received):
+    """Receive into bytearray buf after its first received bytes.
+    
+    The buffer is doubled in place when full, so a message is read with
+    amortized O(1) allocations. Returns the byte count (0 at EOF).
+    """
+    if received == len(buf):
+        buf.extend(bytes(len(buf)))
+    return sock.recv_into(memoryview(buf)[received:])
+
+
+def _set_cork(sock, enabled):
+    """Toggle TCP_CORK where the platform has it (Linux)."""
+    if hasattr(socket, 'TCP_CORK'):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, int(enabled))
+
 
 class UploadServer:
-    """Handles RFC download requests from other peers."""
+    """Handles RFC download requests from other peers.
+    
+    Runs one UploadWorker per CPU core, each with its own listening socket
+    bound to the same port via SO_REUSEPORT so the kernel spreads incoming
+    connections across them. Without SO_REUSEPORT (e.g. Windows) a single
+    worker is used.
+    """
     
     def __init__(self, rfc_dir):
         self.rfc_dir = rfc_dir
-        self.server_socket = None
+        self.sockets = []   # listening sockets, one per worker
+        self.mtime_cache = {}   # path -> (st_mtime_ns, encoded Last-Modified)
         self.port = 0
         self.running = False
     
     def start(self):
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.server_socket.bind(('0.0.0.0', 0))
-        self.port = self.server_socket.getsockname()[1]
-        self.server_socket.listen(5)
+        listener = self._make_listener(0)
+        self.port = listener.getsockname()[1]
         self.running = True
         
-        t = threading.Thread(target=self._accept_loop)
-        t.daemon = True
-        t.start()
-        print(f"[Peer] Upload server started on port {self.port}")
+        workers = (os.cpu_count() or 1) if hasattr(socket, 'SO_REUSEPORT') else 1
+        for i in range(workers):
+            t = threading.Thread(target=self._run_worker, args=(listener if i == 0 else None,))
+            t.daemon = True
+            t.start()
+        print(f"[Peer] Upload server started on port {self.port} "
+              f"({workers} worker{'s' if workers != 1 else ''})")
     
     def stop(self):
+        # Close the listeners now so new connects are refused at once; each
+        # worker notices within one select timeout and closes its connections
         self.running = False
-        if self.server_socket:
+        for sock in self.sockets:
+            sock.close()
+        self.sockets = []
+    
+    def _make_listener(self, port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(('0.0.0.0', port))
+        sock.listen(5)
+        sock.setblocking(False)
+        self.sockets.append(sock)
+        return sock
+    
+    def _run_worker(self, listener):
+        if listener is None:
+            # Create the extra listeners on their own worker thread
+            try:
+                listener = self._make_listener(self.port)
+            except socket.error as e:
+                logger.warning("[Peer] Upload worker not started: %s", e)
+                return
+        UploadWorker(self, listener).run()
+
+
+class UploadWorker:
+    """Event loop serving one listening socket of the UploadServer.
+    
+    A single thread multiplexes all of this listener's connections with a
+    selector (epoll on Linux). Each connection moves from reading its
+    request header to sending the response, tracked in self.connections.
+    """
+    
+    def __init__(self, upload_server, listener):
+        self.upload_server = upload_server
+        self.rfc_dir = upload_server.rfc_dir
+        self.mtime_cache = upload_server.mtime_cache
+        self.server_socket = listener
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(listener, selectors.EVENT_READ)
+        self.connections = {}   # fd -> per-connection state
+        self.recv_buf = bytearray(4096)   # scratch buffer shared by this loop's recvs
+    
+    def run(self):
+        try:
+            while self.upload_server.running:
+                try:
+                    events = self.selector.select(timeout=0.5)
+                except OSError:
+                    # stop() closed the listener under select() (Windows)
+                    if self.upload_server.running:
+                        raise
+                    break
+                for key, mask in events:
+                    sock = key.fileobj
+                    if sock is self.server_socket:
+                        self._accept()
+                    elif mask & selectors.EVENT_READ:
+                        self._read_request(sock)
+                    elif mask & selectors.EVENT_WRITE:
+                        self._send_response(sock)
+        finally:
+            for conn in list(self.connections.values()):
+                self._close(conn['sock'])
+            self.selector.close()
             self.server_socket.close()
     
-    def _accept_loop(self):
-        while self.running:
+    def _accept(self):
+        # Drain the whole accept queue per wakeup, and try each new
+        # connection's recv right away: the GET usually arrives with the
+        # handshake, so this saves a trip through select()
+        while True:
             try:
                 client_sock, addr = self.server_socket.accept()
-                print(f"[Peer] Upload connection from {addr}")
-                t = threading.Thread(target=self._handle_download, args=(client_sock,))
-                t.daemon = True
-                t.start()
-            except socket.error:
-                pass
-    
-    def _handle_download(self, client_sock):
-        try:
-            # Receive request
-            data = b""
-            while b"\r\n\r\n" not in data:
-                chunk = client_sock.recv(4096)
-                if not chunk:
-                    return
-                data += chunk
-            
-            request_str = data.decode()
-            print(f"[Peer] Received GET request:\n{request_str.strip()}")
-            
-            req = parse_p2p_request(request_str)
-            if not req:
-                client_sock.send(build_get_response(400).encode())
+            except BlockingIOError:
                 return
-            
-            if req['version'] != VERSION:
-                client_sock.send(build_get_response(505).encode())
+            except OSError:
+                # stop() closed the listener
+                if self.upload_server.running:
+                    raise
                 return
+            logger.debug("[Peer] Upload connection from %s", addr)
+            client_sock.setblocking(False)
+            # Answers must not wait on Nagle; a large send buffer lets one
+            # sendfile call queue most of an RFC
+            client_sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client_sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+            self.connections[client_sock.fileno()] = {
+                'sock': client_sock,
+                'buf': bytearray(),   # request bytes received so far
+                'phase': 'header',
+                'out': b"",        # response header bytes not yet sent
+                'file': None,      # RFC file for the body, if any
+                'offset': 0,
+                'size': 0,
+                'rfc_num': None,
+                'pipe': None,      # (read_fd, write_fd) for the splice fallback
+                'piped': 0,
+            }
+            self.selector.register(client_sock, selectors.EVENT_READ)
+            self._read_request(client_sock)
+    
+    def _close(self, sock):
+        conn = self.connections.pop(sock.fileno(), None)
+        if conn and conn['file']:
+            conn['file'].close()
+        if conn and conn['pipe']:
+            for fd in conn['pipe']:
+                os.close(fd)
+        self.selector.unregister(sock)
+        sock.close()
+    
+    def _read_request(self, sock):
+        conn = self.connections[sock.fileno()]
+        try:
+            n = sock.recv_into(self.recv_buf)
+        except BlockingIOError:
+            return
+        except socket.error as e:
+            logger.warning("[Peer] Upload error: %s", e)
+            self._close(sock)
+            return
+        if not n:
+            self._close(sock)
+            return
+        
+        conn['buf'] += memoryview(self.recv_buf)[:n]
+        self._process_request(sock)
+    
+    def _process_request(self, sock):
+        """Start responding if a complete request header has been buffered."""
+        conn = self.connections[sock.fileno()]
+        if b"\r\n\r\n" not in conn['buf']:
+            return
+        
+        try:
+            self._prepare_response(conn)
+        except Exception as e:
+            logger.warning("[Peer] Upload error: %s", e)
+            self._close(sock)
+            return
+        conn['phase'] = 'sending'
+        self.selector.modify(sock, selectors.EVENT_WRITE)
+        # The send buffer is normally empty here, so start sending now
+        self._send_response(sock)
+    
+    def _prepare_response(self, conn):
+        """Parse the buffered GET request and queue the response for sending."""
+        header_end = conn['buf'].index(b"\r\n\r\n") + 4
+        request_str = conn['buf'][:header_end].decode()
+        del conn['buf'][:header_end]
+        logger.debug("[Peer] Received GET request:\n%s", request_str)
+        
+        req = parse_p2p_request(request_str)
+        if not req:
+            conn['out'] = build_get_error_response(400)
+            return
+        
+        if req['version'] != VERSION:
+            conn['out'] = build_get_error_response(505)
+            return
+        
+        rfc_num = req['rfc_number']
+        rfc_file = os.path.join(self.rfc_dir, f"rfc{rfc_num}.txt")
+        
+        try:
+            st = os.stat(rfc_file)
+        except FileNotFoundError:
+            conn['out'] = build_get_error_response(404)
+            logger.debug("[Peer] RFC %s not found", rfc_num)
+            return
+        size = st.st_size
+        
+        # Reformat Last-Modified only when the file has changed
+        cached = self.mtime_cache.get(rfc_file)
+        if cached and cached[0] == st.st_mtime_ns:
+            last_mod = cached[1]
+        else:
+            last_mod = formatdate(st.st_mtime, usegmt=True).encode('ascii')
+            self.mtime_cache[rfc_file] = (st.st_mtime_ns, last_mod)
+        
+        conn['out'] = build_get_response_header(size, last_mod)
+        conn['file'] = open(rfc_file, 'rb')
+        # Hold partial frames until the body is queued, so the header shares
+        # a segment with the start of the body
+        _set_cork(conn['sock'], True)
+        conn['size'] = size
+        conn['rfc_num'] = rfc_num
+    
+    def _send_response(self, sock):
+        """Send as much of the queued response as the socket accepts."""
+        conn = self.connections[sock.fileno()]
+        f = conn['file']
+        try:
+            if conn['out']:
+                sent = sock.send(conn['out'])
+                conn['out'] = conn['out'][sent:]
+                if conn['out']:
+                    return
             
-            rfc_num = req['rfc_number']
-            rfc_file = os.path.join(self.rfc_dir, f"rfc{rfc_num}.txt")
-            
-            if not os.path.exists(rfc_file):
-                client_sock.send(build_get_response(404).encode())
-                print(f"[Peer] RFC {rfc_num} not found")
+            # Body goes file -> socket inside the kernel; partial writes
+            # resume from the saved offset on the next writable event
+            while f and conn['offset'] < conn['size']:
+                sent = self._send_body_chunk(conn)
+                if not sent:
+                    break
+                conn['offset'] += sent
+        except BlockingIOError:
+            return
+        except socket.error as e:
+            logger.warning("[Peer] Upload error: %s", e)
+            self._close(sock)
+            return
+        
+        if f:
+            logger.debug("[Peer] Sent RFC %s (%d bytes)", conn['rfc_num'], conn['offset'])
+            f.close()
+            _set_cork(sock, False)
+            if conn['offset'] < conn['size']:
+                # File shrank while sending; the response cannot be completed
+                conn['file'] = None
+                self._close(sock)
                 return
-            
-            with open(rfc_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            mtime = os.path.getmtime(rfc_file)
-            last_mod = datetime.utcfromtimestamp(mtime).strftime("%a, %d %b %Y %H:%M:%S GMT")
-            
-            client_sock.send(build_get_response(200, content, last_mod).encode())
-            print(f"[Peer] Sent RFC {rfc_num} ({len(content)} bytes)")
-            
-        except Exception as e:
-            print(f"[Peer] Upload error: {e}")
-        finally:
-            client_sock.close()
+        
+        # Keep the connection open for the peer's next GET
+        conn.update(phase='header', out=b"", file=None, offset=0, size=0, rfc_num=None)
+        self.selector.modify(sock, selectors.EVENT_READ)
+        self._process_request(sock)
+    
+    def _send_body_chunk(self, conn):
+        """Copy part of the RFC file to the socket, returning bytes sent.
+        
+        Uses sendfile(2) where possible. If the file system does not support
+        it, falls back to splice(2) through a pipe, which still keeps the
+        data in the kernel, and only then to a user-space read.
+        """
+        sock, f = conn['sock'], conn['file']
+        remaining = conn['size'] - conn['offset']
+        
+        if conn['pipe'] is None:
+            if hasattr(os, 'sendfile'):
+                try:
+                    return os.sendfile(sock.fileno(), f.fileno(), conn['offset'], remaining)
+                except OSError as e:
+                    if e.errno not in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+                        raise
+            if not hasattr(os, 'splice'):
+                f.seek(conn['offset'])
+                return sock.send(f.read(min(remaining, 65536)))
+            conn['pipe'] = os.pipe()
+        
+        # Bytes already moved into the pipe but not yet accepted by the
+        # socket are tracked in conn['piped']
+        pipe_r, pipe_w = conn['pipe']
+        if not conn['piped']:
+            conn['piped'] = os.splice(f.fileno(), pipe_w, min(remaining, 65536),
+                                      offset_src=conn['offset'], flags=os.SPLICE_F_MOVE)
+            if not conn['piped']:
+                return 0
+        sent = os.splice(pipe_r, sock.fileno(), conn['piped'],
+                         flags=os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK)
+        conn['piped'] -= sent
+        return sent
 
 
 class Peer:
@@ -106,14 +351,15 @@ class Peer:
         self.hostname = socket.gethostname()
         self.rfc_dir = rfc_dir or os.path.join(os.path.dirname(__file__), RFC_DIR)
         
-        if not os.path.exists(self.rfc_dir):
-            os.makedirs(self.rfc_dir)
+        os.makedirs(self.rfc_dir, exist_ok=True)
         
         self.upload_server = UploadServer(self.rfc_dir)
         self.upload_port = 0
+        self._peer_sockets = {}   # (host, port) -> open connection for GETs
     
     def connect(self):
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         self.server_socket.connect((self.server_host, self.server_port))
         print(f"[Peer] Connected to server at port {self.server_port}")
     
@@ -126,66 +372,101 @@ class Peer:
     def start(self):
         self.upload_server.start()
         self.upload_port = self.upload_server.port
+        # LIST ALL never changes for this peer, so encode it once
+        self._list_request = build_list_request(self.hostname, self.upload_port).encode()
         self.connect()
         self._register_with_server()
         self._register_local_rfcs()
     
     def _register_with_server(self):
         """Send initial LIST to register even if no RFCs."""
-        request = build_list_request(self.hostname, self.upload_port)
-        self.server_socket.send(request.encode())
+        self.server_socket.sendall(self._list_request)
         # Receive silently
-        data = b""
-        while b"\r\n\r\n" not in data:
-            chunk = self.server_socket.recv(4096)
-            if not chunk:
-                break
-            data += chunk
+        self._recv_p2s_response()
     
     def stop(self):
         self.upload_server.stop()
+        for sock in self._peer_sockets.values():
+            sock.close()
+        self._peer_sockets.clear()
         self.disconnect()
         print("[Peer] Peer stopped")
     
     def _send_request(self, request):
-        self.server_socket.send(request.encode())
-        data = b""
+        """Send an encoded P2S request and return the raw response bytes."""
+        self.server_socket.sendall(request)
+        return self._recv_p2s_response()
+    
+    def _recv_p2s_response(self):
+        """Read one P2S response.
+        
+        The data lines follow the blank line after the status line, and the
+        response ends at the next empty line, so stop at the first CRLFCRLF
+        found after the status line.
+        """
+        buf = bytearray(4096)
+        received = 0
         while True:
-            chunk = self.server_socket.recv(4096)
-            if not chunk:
+            n = _recv_more(self.server_socket, buf, received)
+            if not n:
                 break
-            data += chunk
-            if b"\r\n\r\n" in data:
+            received += n
+            status_end = buf.find(b"\r\n", 0, received)
+            if status_end != -1 and buf.find(b"\r\n\r\n", status_end + 2, received) != -1:
                 break
-        return data.decode()
+        del buf[received:]
+        return buf
     
     def _register_local_rfcs(self):
         if not os.path.exists(self.rfc_dir):
             return
-        for fname in os.listdir(self.rfc_dir):
-            if fname.startswith('rfc') and fname.endswith('.txt'):
-                try:
-                    rfc_num = int(fname[3:-4])
-                    title = self._get_title(os.path.join(self.rfc_dir, fname))
-                    self.add_rfc(rfc_num, title)
-                except ValueError:
-                    pass
+        items = []
+        with os.scandir(self.rfc_dir) as entries:
+            for entry in entries:
+                m = _RFC_RE.match(entry.name)
+                if m and entry.is_file():
+                    rfc_num = int(m.group(1))
+                    title = self._get_title(entry.path, entry.stat().st_size)
+                    items.append((rfc_num, title))
+        if not items:
+            return
+        
+        # One ADDMANY round trip instead of one ADD per RFC
+        for rfc_num, title in items:
+            print(f"[Peer] Registering RFC {rfc_num}: {title}")
+        request = build_addmany_request(self.hostname, self.upload_port, items)
+        response = self._send_request(request.encode())
+        print(response.decode().strip())
     
-    def _get_title(self, filepath):
+    def _get_title(self, filepath, size=None):
+        """Return the first non-empty line of an RFC file (at most 100 chars).
+        
+        Only the first page of the file is mapped and searched, so the rest
+        of the RFC is never read.
+        """
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if line:
-                        return line[:100]
-        except:
+            if size is None:
+                size = os.path.getsize(filepath)
+            with open(filepath, 'rb') as f:
+                with mmap.mmap(f.fileno(), min(4096, size), access=mmap.ACCESS_READ) as mm:
+                    pos = 0
+                    while pos < len(mm):
+                        eol = mm.find(b'\n', pos)
+                        if eol == -1:
+                            eol = len(mm)
+                        line = mm[pos:eol].strip()
+                        if line:
+                            return line.decode('utf-8', 'ignore')[:100]
+                        pos = eol + 1
+        except (OSError, ValueError):
+            # Unreadable or empty file (an empty mapping raises ValueError)
             pass
         return os.path.basename(filepath)
     
     def add_rfc(self, rfc_num, title):
         request = build_add_request(rfc_num, self.hostname, self.upload_port, title)
         print(f"[Peer] Registering RFC {rfc_num}: {title}")
-        response = self._send_request(request)
+        response = self._send_request(request.encode()).decode()
         print(response.strip())
         return response
     
@@ -193,49 +474,59 @@ class Peer:
         request = build_lookup_request(rfc_num, self.hostname, self.upload_port, title)
         print(f"\n[Peer] Looking up RFC {rfc_num}")
         print(f"Request:\n{request.strip()}")
-        response = self._send_request(request)
-        print(f"Response:\n{response.strip()}")
+        response = self._send_request(request.encode())
+        print(f"Response:\n{response.decode().strip()}")
         return parse_p2s_response(response)
     
     def list_rfcs(self):
-        request = build_list_request(self.hostname, self.upload_port)
+        request = self._list_request
         print(f"\n[Peer] Sending LIST ALL request")
-        print(f"Request:\n{request.strip()}")
+        print(f"Request:\n{request.decode().strip()}")
         response = self._send_request(request)
-        print(f"Response:\n{response.strip()}")
+        print(f"Response:\n{response.decode().strip()}")
         return parse_p2s_response(response)
     
     def download_rfc(self, rfc_num, peer_host, peer_port):
         print(f"\n[Peer] Downloading RFC {rfc_num} from {peer_host}:{peer_port}")
         
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.connect((peer_host, peer_port))
-            
             request = build_get_request(rfc_num, peer_host)
             print(f"Request:\n{request.strip()}")
-            sock.send(request.encode())
+            request = request.encode()
             
-            data = b""
-            while True:
-                chunk = sock.recv(4096)
-                if not chunk:
-                    break
-                data += chunk
-            sock.close()
+            key = (peer_host, peer_port)
+            reused = key in self._peer_sockets
+            try:
+                sock = self._get_peer_sock(peer_host, peer_port)
+                sock.sendall(request)
+                header, body_start = self._recv_get_header(sock)
+            except (socket.error, ConnectionError):
+                self._drop_peer_sock(key)
+                if not reused:
+                    raise
+                # The cached connection went stale; retry once on a fresh one
+                sock = self._get_peer_sock(peer_host, peer_port)
+                sock.sendall(request)
+                header, body_start = self._recv_get_header(sock)
             
-            response = parse_p2p_response(data.decode())
+            # Only the header is decoded; the body is streamed to disk as bytes
+            response = parse_p2p_response(header)
             
             if response and response['status_code'] == 200:
+                content_length = int(response['headers'].get('Content-Length', 0))
                 print(f"Response:")
                 print(f"{VERSION} {response['status_code']} {response['phrase']}")
                 for k, v in response['headers'].items():
                     print(f"{k}: {v}")
-                print(f"<RFC {rfc_num} content - {len(response['data'])} bytes>")
+                print(f"<RFC {rfc_num} content - {content_length} bytes>")
                 
                 rfc_file = os.path.join(self.rfc_dir, f"rfc{rfc_num}.txt")
-                with open(rfc_file, 'w', encoding='utf-8') as f:
-                    f.write(response['data'])
+                try:
+                    self._recv_body_to_file(sock, body_start, content_length, rfc_file)
+                except Exception:
+                    # Connection is mid-response and cannot be reused
+                    self._drop_peer_sock(key)
+                    raise
                 
                 print(f"\n[Peer] Downloaded RFC {rfc_num} successfully")
                 print(f"[Peer] Saved to {rfc_file}")
@@ -252,6 +543,67 @@ class Peer:
             print(f"[Peer] Download error: {e}")
             return False
     
+    def _get_peer_sock(self, host, port):
+        """Return the cached connection to a peer's upload server, opening one if needed."""
+        key = (host, port)
+        sock = self._peer_sockets.get(key)
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            sock.connect(key)
+            self._peer_sockets[key] = sock
+        return sock
+    
+    def _drop_peer_sock(self, key):
+        sock = self._peer_sockets.pop(key, None)
+        if sock:
+            sock.close()
+    
+    def _recv_get_header(self, sock):
+        """Read a GET response header.
+        
+        Returns (header, body_start) where body_start is a view of any body
+        bytes that arrived in the same segments as the header.
+        """
+        buf = bytearray(4096)
+        received = 0
+        header_end = -1
+        while header_end == -1:
+            n = _recv_more(sock, buf, received)
+            if not n:
+                raise ConnectionError("connection closed by peer")
+            received += n
+            header_end = buf.find(b"\r\n\r\n", 0, received)
+        header_end += 4
+        mv = memoryview(buf)
+        return bytes(mv[:header_end]), mv[header_end:received]
+    
+    def _recv_body_to_file(self, sock, body_start, content_length, path):
+        """Write content_length body bytes from sock to path without decoding.
+        
+        Data goes to a temporary file that replaces path only once the full
+        body has arrived, so a failed download never leaves a truncated RFC.
+        """
+        tmp_path = path + ".part"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(body_start[:content_length])
+                remaining = content_length - min(len(body_start), content_length)
+                buf = bytearray(65536)
+                mv = memoryview(buf)
+                while remaining:
+                    n = sock.recv_into(mv[:min(remaining, len(buf))])
+                    if not n:
+                        raise ConnectionError("connection closed by peer")
+                    f.write(mv[:n])
+                    remaining -= n
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    
     def interactive_menu(self):
         print("\n" + "=" * 50)
         print("P2P-CI Peer Client")
@@ -309,7 +661,9 @@ class Peer:
             elif choice == '5':
                 print("\nLocal RFC files:")
                 if os.path.exists(self.rfc_dir):
-                    files = [f for f in os.listdir(self.rfc_dir) if f.endswith('.txt')]
+                    with os.scandir(self.rfc_dir) as entries:
+                        files = [e.name for e in entries
+                                 if e.name.endswith('.txt') and e.is_file()]
                     for f in sorted(files) if files else ["  (none)"]:
                         print(f"  {f}")
                 else:
@@ -325,8 +679,12 @@ def main():
     parser = argparse.ArgumentParser(description='P2P-CI Peer')
     parser.add_argument('-s', '--server', default='localhost', help='Server host')
     parser.add_argument('-d', '--rfc-dir', default=None, help='RFC directory')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log each upload request')
     args = parser.parse_args()
     
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(message)s')
+    
     print("=" * 50)
     print("P2P-CI Peer Application")
     print("=" * 50)
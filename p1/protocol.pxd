@@ -0,0 +1,26 @@
+# Cython typing overlay for protocol.py.
+# Build with `make cython`; without a compiled module the plain .py is used.
+
+cimport cython
+
+@cython.locals(end=Py_ssize_t, eol=Py_ssize_t, sp=Py_ssize_t, pos=Py_ssize_t,
+               headers=dict)
+cdef tuple _parse_request_head(str message, frozenset methods)
+
+cpdef dict _with_rfc_number(dict req, str message, Py_ssize_t end)
+cpdef dict _with_all(dict req, str message, Py_ssize_t end)
+
+@cython.locals(items=list)
+cpdef dict _with_items(dict req, str message, Py_ssize_t end)
+
+@cython.locals(head=tuple, end=Py_ssize_t, req=dict)
+cpdef dict parse_p2s_request(str message)
+
+@cython.locals(eol=Py_ssize_t, sep=Py_ssize_t, first_line=list, data_lines=list)
+cpdef dict parse_p2s_response(object message)
+
+@cython.locals(head=tuple)
+cpdef dict parse_p2p_request(str message)
+
+@cython.locals(end=Py_ssize_t, eol=Py_ssize_t, first_line=list, headers=dict)
+cpdef dict parse_p2p_response(object message)
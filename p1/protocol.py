@@ -1,101 +1,225 @@
 # Protocol message formatting and parsing for P2P-CI
 
 import platform
-from datetime import datetime
-from config import VERSION, STATUS_CODES
+import re
+import time
+from email.utils import formatdate
+from config import VERSION, STATUS_CODES, P2S_METHODS, P2P_METHODS
 
 CRLF = "\r\n"
 
+def _status_line(status_code):
+    return f"{VERSION} {status_code} {STATUS_CODES.get(status_code, 'Unknown')}{CRLF}"
+
+# Status lines for the known codes, shared by P2S and P2P responses
+_STATUS_LINE = {code: _status_line(code) for code in STATUS_CODES}
+_STATUS_LINE_BYTES = {code: line.encode() for code, line in _STATUS_LINE.items()}
+
+# The OS string is fixed for the life of the process
+_OS_INFO = f"{platform.system()} {platform.release()}"
+
 def get_os_info():
-    return f"{platform.system()} {platform.release()}"
+    return _OS_INFO
+
+# The Date header only changes once per second, so reuse the last string
+# (and its encoded form)
+_date_second = None
+_date_string = ""
+_date_bytes = b""
 
 def get_date_string():
-    return datetime.utcnow().strftime("%a, %d %b %Y %H:%M:%S GMT")
+    global _date_second, _date_string, _date_bytes
+    now = int(time.time())
+    if now != _date_second:
+        _date_string = formatdate(now, usegmt=True)
+        _date_bytes = _date_string.encode('ascii')
+        _date_second = now
+    return _date_string
+
+def _get_date_bytes():
+    get_date_string()
+    return _date_bytes
 
 
 # --- P2S Protocol (Peer-to-Server) ---
 
+# Message templates: the constant text (version, field names, CRLFs) is
+# assembled once at import and each builder only fills in the fields.
+_ADD_FMT = (
+    f"ADD RFC {{0}} {VERSION}{CRLF}"
+    f"Host: {{1}}{CRLF}"
+    f"Port: {{2}}{CRLF}"
+    f"Title: {{3}}{CRLF}"
+    f"{CRLF}"
+).format
+
+_LOOKUP_FMT = (
+    f"LOOKUP RFC {{0}} {VERSION}{CRLF}"
+    f"Host: {{1}}{CRLF}"
+    f"Port: {{2}}{CRLF}"
+    f"Title: {{3}}{CRLF}"
+    f"{CRLF}"
+).format
+
+_ADDMANY_FMT = (
+    f"ADDMANY ALL {VERSION}{CRLF}"
+    f"Host: {{0}}{CRLF}"
+    f"Port: {{1}}{CRLF}"
+    f"Content-Length: {{2}}{CRLF}"
+    f"{CRLF}"
+).format
+
+_LIST_FMT = (
+    f"LIST ALL {VERSION}{CRLF}"
+    f"Host: {{0}}{CRLF}"
+    f"Port: {{1}}{CRLF}"
+    f"{CRLF}"
+).format
+
 def build_add_request(rfc_number, hostname, port, title):
-    return (
-        f"ADD RFC {rfc_number} {VERSION}{CRLF}"
-        f"Host: {hostname}{CRLF}"
-        f"Port: {port}{CRLF}"
-        f"Title: {title}{CRLF}"
-        f"{CRLF}"
-    )
+    return _ADD_FMT(rfc_number, hostname, port, title)
 
 def build_lookup_request(rfc_number, hostname, port, title):
-    return (
-        f"LOOKUP RFC {rfc_number} {VERSION}{CRLF}"
-        f"Host: {hostname}{CRLF}"
-        f"Port: {port}{CRLF}"
-        f"Title: {title}{CRLF}"
-        f"{CRLF}"
-    )
+    return _LOOKUP_FMT(rfc_number, hostname, port, title)
+
+def build_addmany_request(hostname, port, items):
+    """Build one request registering several RFCs.
+    
+    items is a list of (rfc_number, title). They are carried in the body,
+    one "rfc_number<TAB>title" per line, framed by Content-Length.
+    """
+    body = "".join(f"{rfc_number}\t{title}\n" for rfc_number, title in items)
+    return _ADDMANY_FMT(hostname, port, len(body.encode('utf-8'))) + body
 
 def build_list_request(hostname, port):
-    return (
-        f"LIST ALL {VERSION}{CRLF}"
-        f"Host: {hostname}{CRLF}"
-        f"Port: {port}{CRLF}"
-        f"{CRLF}"
-    )
+    return _LIST_FMT(hostname, port)
 
 def build_p2s_response(status_code, data_lines=None):
-    phrase = STATUS_CODES.get(status_code, "Unknown")
-    response = f"{VERSION} {status_code} {phrase}{CRLF}{CRLF}"
-    if data_lines:
-        for line in data_lines:
-            response += f"{line}{CRLF}"
-    return response
+    status_line = _STATUS_LINE.get(status_code) or _status_line(status_code)
+    body = CRLF.join(data_lines) + CRLF if data_lines else ""
+    # Terminating empty line, so the receiver knows where the data ends
+    return f"{status_line}{CRLF}{body}{CRLF}"
 
-def parse_p2s_request(message):
-    """Parse P2S request. Returns dict with method, rfc_number, version, headers."""
-    lines = message.strip().split(CRLF)
-    if not lines:
-        return None
+def build_p2s_response_bytes(status_code, encoded_lines=()):
+    """Build an encoded P2S response from data lines that are already
+    encoded and CRLF-terminated."""
+    status_line = _STATUS_LINE_BYTES.get(status_code) or _status_line(status_code).encode()
+    return b"".join((status_line, b"\r\n", *encoded_lines, b"\r\n"))
+
+# One "Name: value" header field per line
+_HDR_RE = re.compile(r"^([^:\r\n]+): ([^\r\n]*)", re.MULTILINE)
+_HDR_RE_BYTES = re.compile(_HDR_RE.pattern.encode(), re.MULTILINE)
+
+def _parse_request_head(message, methods):
+    """Parse the request line and header fields of a P2S or P2P request.
     
-    first_line = lines[0].split()
-    if len(first_line) < 3:
-        return None
+    The request line 'METHOD SP (RFC SP number | ALL) SP version' is read in
+    one pass by locating each space, without splitting it into a list.
+    Returns (method, rfc_number, version, headers, end) where end is the
+    index of the blank line closing the header, or None if malformed.
+    The message must not start with whitespace.
+    """
+    end = message.find(CRLF + CRLF)
+    if end < 0:
+        end = len(message.rstrip())
+    eol = message.find(CRLF, 0, end)
+    if eol < 0:
+        eol = end
     
-    method = first_line[0]
-    version = first_line[-1]
+    sp = message.find(" ", 0, eol)
+    if sp < 0:
+        return None
+    method = message[:sp]
+    if method not in methods:
+        return None
     
-    # LIST ALL vs ADD/LOOKUP RFC <number>
-    if method == "LIST":
+    pos = sp + 1
+    if message.startswith("ALL ", pos, eol):
         rfc_number = "ALL"
-    else:
-        if len(first_line) < 4 or first_line[1] != "RFC":
+        pos += 4
+    elif message.startswith("RFC ", pos, eol):
+        pos += 4
+        sp = message.find(" ", pos, eol)
+        if sp < 0:
             return None
         try:
-            rfc_number = int(first_line[2])
+            rfc_number = int(message[pos:sp])
         except ValueError:
             return None
+        pos = sp + 1
+    else:
+        return None
+    
+    version = message[pos:eol]
+    if not version or " " in version:
+        return None
+    
+    headers = dict(_HDR_RE.findall(message, eol + 2, end))
     
-    # Parse headers
-    headers = {}
-    for line in lines[1:]:
+    return method, rfc_number, version, headers, end
+
+def _with_rfc_number(req, message, end):
+    # ADD/LOOKUP RFC <number>
+    return None if req["rfc_number"] == "ALL" else req
+
+def _with_all(req, message, end):
+    # LIST ALL
+    req["rfc_number"] = "ALL"
+    return req
+
+def _with_items(req, message, end):
+    # ADDMANY ALL, followed by a body of "number<TAB>title" lines
+    req["rfc_number"] = "ALL"
+    items = []
+    for line in message[end + 4:].split("\n"):
         if not line:
-            break
-        if ": " in line:
-            key, value = line.split(": ", 1)
-            headers[key] = value
+            continue
+        number, _, title = line.partition("\t")
+        try:
+            items.append((int(number), title))
+        except ValueError:
+            return None
+    req["items"] = items
+    return req
+
+# Method-specific checks run after the common request line/header parse
+_P2S_PARSERS = {
+    "ADD": _with_rfc_number,
+    "LOOKUP": _with_rfc_number,
+    "LIST": _with_all,
+    "ADDMANY": _with_items,
+}
+
+def parse_p2s_request(message):
+    """Parse P2S request. Returns dict with method, rfc_number, version, headers."""
+    message = message.lstrip()
+    head = _parse_request_head(message, P2S_METHODS)
+    if head is None:
+        return None
+    method, rfc_number, version, headers, end = head
     
-    return {
+    req = {
         "method": method,
         "rfc_number": rfc_number,
         "version": version,
         "headers": headers
     }
+    return _P2S_PARSERS[method](req, message, end)
 
 def parse_p2s_response(message):
-    """Parse P2S response. Returns dict with version, status_code, phrase, data_lines."""
-    lines = message.strip().split(CRLF)
-    if not lines:
-        return None
+    """Parse P2S response bytes. Returns dict with version, status_code, phrase, data_lines.
+    
+    The message (bytes, bytearray or memoryview) is split as bytes; only
+    the fields returned are decoded.
+    """
+    if isinstance(message, memoryview):
+        message = bytes(message)   # memoryview has no find() or split()
+    message = message.lstrip()
+    eol = message.find(b"\r\n")
+    if eol < 0:
+        eol = len(message)
     
-    first_line = lines[0].split(None, 2)
+    first_line = message[:eol].split(None, 2)
     if len(first_line) < 3:
         return None
     
@@ -104,101 +228,126 @@ def parse_p2s_response(message):
     except ValueError:
         return None
     
-    # Find data after empty line
+    # Data lines follow the empty line after the status line
     data_lines = []
-    found_sep = False
-    for line in lines[1:]:
-        if not found_sep:
-            if line == "":
-                found_sep = True
-        elif line:
-            data_lines.append(line)
+    sep = message.find(b"\r\n\r\n", eol)
+    if sep >= 0:
+        for line in message[sep + 4:].splitlines():
+            if line:
+                data_lines.append(line.decode('utf-8', 'replace'))
     
     return {
-        "version": first_line[0],
+        "version": first_line[0].decode('ascii', 'replace'),
         "status_code": status_code,
-        "phrase": first_line[2],
+        "phrase": first_line[2].decode('ascii', 'replace'),
         "data_lines": data_lines
     }
 
 
 # --- P2P Protocol (Peer-to-Peer) ---
 
+_GET_FMT = (
+    f"GET RFC {{0}} {VERSION}{CRLF}"
+    f"Host: {{1}}{CRLF}"
+    f"OS: {{2}}{CRLF}"
+    f"{CRLF}"
+).format
+
+# The 200 header is kept as bytes with the constant OS field filled in,
+# so each response only interpolates Date, Last-Modified and Content-Length
+_GET_200_HEADER = (
+    f"{_STATUS_LINE[200]}"
+    f"Date: %s{CRLF}"
+    f"OS: {_OS_INFO.replace('%', '%%')}{CRLF}"
+    f"Last-Modified: %s{CRLF}"
+    f"Content-Length: %d{CRLF}"
+    f"Content-Type: text/plain{CRLF}"
+    f"{CRLF}"
+).encode()
+
+_GET_STATUS_FMT = (
+    f"{{0}}"
+    f"Date: {{1}}{CRLF}"
+    f"OS: {{2}}{CRLF}"
+    f"{CRLF}"
+).format
+
 def build_get_request(rfc_number, hostname, os_info=None):
     if os_info is None:
         os_info = get_os_info()
-    return (
-        f"GET RFC {rfc_number} {VERSION}{CRLF}"
-        f"Host: {hostname}{CRLF}"
-        f"OS: {os_info}{CRLF}"
-        f"{CRLF}"
-    )
+    return _GET_FMT(rfc_number, hostname, os_info)
 
-def build_get_response(status_code, data=None, last_modified=None):
-    phrase = STATUS_CODES.get(status_code, "Unknown")
-    os_info = get_os_info()
-    date_str = get_date_string()
+def build_get_response_header(content_length, last_modified=None):
+    """Build the encoded header block of a 200 GET response.
     
+    last_modified is an already encoded date (bytes); the body is sent
+    separately.
+    """
+    date = _get_date_bytes()
+    return _GET_200_HEADER % (date, last_modified or date, content_length)
+
+def build_get_response(status_code, data=None, last_modified=None):
+    """Build a complete, encoded GET response."""
     if status_code == 200 and data is not None:
-        content_length = len(data.encode('utf-8'))
-        return (
-            f"{VERSION} {status_code} {phrase}{CRLF}"
-            f"Date: {date_str}{CRLF}"
-            f"OS: {os_info}{CRLF}"
-            f"Last-Modified: {last_modified or date_str}{CRLF}"
-            f"Content-Length: {content_length}{CRLF}"
-            f"Content-Type: text/plain{CRLF}"
-            f"{CRLF}"
-            f"{data}"
-        )
-    return (
-        f"{VERSION} {status_code} {phrase}{CRLF}"
-        f"Date: {date_str}{CRLF}"
-        f"OS: {os_info}{CRLF}"
-        f"{CRLF}"
-    )
+        body = data.encode('utf-8')
+        return build_get_response_header(len(body), last_modified) + body
+    
+    return build_get_error_response(status_code)
+
+def _build_get_status_response(status_code, date_str):
+    status_line = _STATUS_LINE.get(status_code) or _status_line(status_code)
+    return _GET_STATUS_FMT(status_line, date_str, get_os_info())
+
+# status_code -> (date string, encoded response)
+_error_responses = {}
+
+def build_get_error_response(status_code):
+    """Return the encoded, body-less GET response for an error status.
+    
+    Only the Date header varies, so each response is built and encoded once
+    and reused until the date string changes.
+    """
+    date_str = get_date_string()
+    cached = _error_responses.get(status_code)
+    if cached is None or cached[0] != date_str:
+        cached = (date_str, _build_get_status_response(status_code, date_str).encode())
+        _error_responses[status_code] = cached
+    return cached[1]
 
 def parse_p2p_request(message):
     """Parse P2P GET request."""
-    lines = message.strip().split(CRLF)
-    if not lines:
-        return None
-    
-    first_line = lines[0].split()
-    if len(first_line) < 4 or first_line[0] != "GET" or first_line[1] != "RFC":
+    head = _parse_request_head(message.lstrip(), P2P_METHODS)
+    if head is None:
         return None
-    
-    try:
-        rfc_number = int(first_line[2])
-    except ValueError:
+    method, rfc_number, version, headers, _ = head
+    if rfc_number == "ALL":
         return None
     
-    headers = {}
-    for line in lines[1:]:
-        if not line:
-            break
-        if ": " in line:
-            key, value = line.split(": ", 1)
-            headers[key] = value
-    
     return {
-        "method": "GET",
+        "method": method,
         "rfc_number": rfc_number,
-        "version": first_line[3],
+        "version": version,
         "headers": headers
     }
 
 def parse_p2p_response(message):
-    """Parse P2P GET response."""
-    parts = message.split(CRLF + CRLF, 1)
-    header_section = parts[0]
-    data = parts[1] if len(parts) > 1 else ""
+    """Parse P2P GET response bytes (bytes, bytearray or memoryview).
     
-    lines = header_section.split(CRLF)
-    if not lines:
-        return None
+    Header fields are decoded; the body is returned undecoded as bytes.
+    """
+    if isinstance(message, memoryview):
+        message = bytes(message)   # memoryview has no find() or split()
+    end = message.find(b"\r\n\r\n")
+    if end < 0:
+        end = len(message)
+        data = b""
+    else:
+        data = message[end + 4:]
     
-    first_line = lines[0].split(None, 2)
+    eol = message.find(b"\r\n", 0, end)
+    if eol < 0:
+        eol = end
+    first_line = message[:eol].split(None, 2)
     if len(first_line) < 3:
         return None
     
@@ -207,16 +356,13 @@ def parse_p2p_response(message):
     except ValueError:
         return None
     
-    headers = {}
-    for line in lines[1:]:
-        if ": " in line:
-            key, value = line.split(": ", 1)
-            headers[key] = value
+    headers = {key.decode('ascii', 'replace'): value.decode('utf-8', 'replace')
+               for key, value in _HDR_RE_BYTES.findall(message, eol + 2, end)}
     
     return {
-        "version": first_line[0],
+        "version": first_line[0].decode('ascii', 'replace'),
         "status_code": status_code,
-        "phrase": first_line[2],
+        "phrase": first_line[2].decode('ascii', 'replace'),
         "headers": headers,
         "data": data
     }
@@ -1,184 +1,464 @@
 # Central Index Server for P2P-CI
 # Maintains active peers and RFC index, handles ADD/LOOKUP/LIST requests
 
+import argparse
+import logging
+import os
+import selectors
 import socket
 import threading
+from collections import OrderedDict, defaultdict, namedtuple
+from itertools import count
 from config import SERVER_PORT, VERSION
-from protocol import parse_p2s_request, build_p2s_response, CRLF
+from protocol import parse_p2s_request, build_p2s_response, build_p2s_response_bytes
+
+# Per-request and state logging; main() sets the level (--quiet drops it)
+logger = logging.getLogger('p2pci')
+
+_CONTENT_LENGTH = b"\r\nContent-Length: "
+
+# sendmsg gathers several buffers per call; Windows lacks it
+_HAS_SENDMSG = hasattr(socket.socket, 'sendmsg')
+_IOV_MAX = 64   # buffers passed per sendmsg call
+
+# Socket buffer size for peer connections, so large LIST responses and
+# bursts of queued requests do not stall on a full buffer
+_SOCK_BUF_SIZE = 4 * 1024 * 1024
+
+# Error responses carry no data, so they are constant
+_RESP_400 = build_p2s_response(400).encode()
+_RESP_404 = build_p2s_response(404).encode()
+_RESP_505 = build_p2s_response(505).encode()
+
+# One indexed RFC; line is the record's encoded response data line
+RfcRecord = namedtuple('RfcRecord', 'rfc_number title hostname port line')
+
+
+def _request_length(buf):
+    """Return the size of the first complete request in buf, or -1.
+    
+    A request ends at the blank line after its header, plus the body that
+    ADDMANY announces in Content-Length.
+    """
+    header_end = buf.find(b"\r\n\r\n")
+    if header_end < 0:
+        return -1
+    length = header_end + 4
+    pos = buf.find(_CONTENT_LENGTH, 0, header_end)
+    if pos >= 0:
+        pos += len(_CONTENT_LENGTH)
+        eol = buf.find(b"\r\n", pos, header_end + 2)
+        body_length = int(buf[pos:eol])
+        if body_length < 0:
+            raise ValueError("negative Content-Length")
+        length += body_length
+    return length if len(buf) >= length else -1
+
+
+def _format_state(peers, records):
+    """Format a CentralServer state snapshot (oldest first) for the log."""
+    lines = ["[Server] === Current State ==="]
+    if peers:
+        lines.append(f"[Server] Active Peers: {', '.join(f'{h}:{p}' for h, p in reversed(peers))}")
+    else:
+        lines.append("[Server] Active Peers: (none)")
+    
+    if records:
+        lines.append("[Server] RFC Index:")
+        lines.extend(f"[Server]   RFC {num} {title} ({host}:{port})"
+                     for num, title, host, port, _ in reversed(records))
+    else:
+        lines.append("[Server] RFC Index: (empty)")
+    lines.append("[Server] =========================")
+    return "\n".join(lines)
 
 
 class CentralServer:
+    """Central index shared by a set of ServerWorker event loops.
+    
+    Runs one ServerWorker per CPU core, each with its own listening socket
+    bound to the same port via SO_REUSEPORT so the kernel spreads incoming
+    connections across them. Without SO_REUSEPORT (e.g. Windows) a single
+    worker is used. The index below is shared by every worker; writers hold
+    self.lock.
+    """
+    
     def __init__(self, host='0.0.0.0', port=SERVER_PORT):
         self.host = host
         self.port = port
-        self.server_socket = None
+        self.threads = []   # threads running the extra workers
         self.lock = threading.Lock()
-        self.peers = []       # [(hostname, port), ...]
-        self.rfc_index = []   # [(rfc_number, title, hostname, port), ...]
+        # (hostname, port) -> None, oldest first: an ordered set that is
+        # listed newest first, as if each peer were inserted at the front
+        self.peers = OrderedDict()
+        # record id -> RfcRecord, oldest first; listed newest first, as if
+        # each record were inserted at the front
+        self.rfc_index = OrderedDict()
+        self.rfc_by_peer = defaultdict(list)   # (hostname, port) -> [record id, ...]
+        self._record_ids = count()
+        # Read-side copies for LOOKUP and LIST, which run without the lock.
+        # Writers (holding the lock) never mutate a published tuple; they
+        # store a new one, and a single reference store is atomic.
+        self.rfc_by_num = {}   # rfc_number -> tuple of records, newest first
+        self._list_response = None   # encoded LIST response, None when stale
+        # method -> handler(req, hostname, port) returning the encoded response
+        self._dispatch = {
+            'ADD': self.handle_add,
+            'ADDMANY': self.handle_addmany,
+            'LOOKUP': lambda req, hostname, port: self.handle_lookup(req),
+            'LIST': lambda req, hostname, port: self.handle_list(),
+        }
         self.running = False
     
     def start(self):
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(5)
+        self.port = self._claim_port(self.port)
+        listener = self._make_listener(self.port)
         self.running = True
         
-        print(f"[Server] Central Index Server started on port {self.port}")
+        workers = (os.cpu_count() or 1) if hasattr(socket, 'SO_REUSEPORT') else 1
+        print(f"[Server] Central Index Server started on port {self.port} "
+              f"({workers} worker{'s' if workers != 1 else ''})")
+        # The kernel may clamp the sizes (net.core.rmem_max/wmem_max)
+        rcvbuf = listener.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        sndbuf = listener.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+        print(f"[Server] Socket buffers: receive {rcvbuf} bytes, send {sndbuf} bytes")
         print(f"[Server] Waiting for peer connections...")
         
+        for _ in range(workers - 1):
+            t = threading.Thread(target=self._run_worker)
+            t.daemon = True
+            t.start()
+            self.threads.append(t)
+        
+        # The first worker runs here so Ctrl-C reaches it
+        worker = ServerWorker(self, listener)
         try:
-            while self.running:
-                try:
-                    client_socket, addr = self.server_socket.accept()
-                    t = threading.Thread(target=self.handle_peer, args=(client_socket, addr))
-                    t.daemon = True
-                    t.start()
-                except socket.error:
-                    if self.running:
-                        raise
+            worker.run()
         except KeyboardInterrupt:
             print("\n[Server] Shutting down...")
         finally:
             self.stop()
+            worker.close()
+            print("[Server] Server stopped")
     
     def stop(self):
+        # Each extra worker notices within one select timeout and closes
+        # its own sockets
         self.running = False
-        if self.server_socket:
-            self.server_socket.close()
-        print("[Server] Server stopped")
+        for t in self.threads:
+            t.join()
+        self.threads = []
     
-    def handle_peer(self, client_socket, client_addr):
-        peer_host, peer_port = None, None
-        first_msg = True
+    def _claim_port(self, port):
+        """Check that port is free and return it (the bound port if 0).
         
+        The SO_REUSEPORT listeners would quietly share the port with a
+        server already running on it, so bind it once without SO_REUSEPORT
+        first; this raises EADDRINUSE if the port is taken.
+        """
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+            probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            probe.bind((self.host, port))
+            return probe.getsockname()[1]
+    
+    def _make_listener(self, port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        # Accepted sockets inherit the listener's buffer sizes; the receive
+        # buffer must be set before listen() to take effect on the window
+        for opt in (socket.SO_RCVBUF, socket.SO_SNDBUF):
+            sock.setsockopt(socket.SOL_SOCKET, opt, _SOCK_BUF_SIZE)
+        sock.bind((self.host, port))
+        # Room for a burst of connects while the workers are busy
+        sock.listen(1024)
+        sock.setblocking(False)
+        return sock
+    
+    def _run_worker(self):
+        # Create the extra listeners on their own worker thread
         try:
-            while self.running:
-                data = self.recv_message(client_socket)
-                if not data:
-                    break
-                
-                req = parse_p2s_request(data)
-                if not req:
-                    client_socket.send(build_p2s_response(400).encode())
-                    continue
-                
-                if req['version'] != VERSION:
-                    client_socket.send(build_p2s_response(505).encode())
-                    continue
-                
-                peer_host = req['headers'].get('Host', client_addr[0])
-                peer_port = int(req['headers'].get('Port', 0))
-                
-                if first_msg:
-                    print(f"[Server] Connection from host {peer_host} at {client_addr[0]}:{peer_port}")
-                    with self.lock:
-                        if not self._peer_exists(peer_host, peer_port):
-                            self.peers.insert(0, (peer_host, peer_port))
-                            print(f"[Server] Added {peer_host}:{peer_port}")
-                        self._print_state()
-                    first_msg = False
-                
-                # Handle request
-                method = req['method']
-                if method == 'ADD':
-                    response = self.handle_add(req, peer_host, peer_port)
-                elif method == 'LOOKUP':
-                    response = self.handle_lookup(req)
-                elif method == 'LIST':
-                    response = self.handle_list()
-                else:
-                    response = build_p2s_response(400)
-                
-                client_socket.send(response.encode())
-                
-        except Exception as e:
-            print(f"[Server] Error handling peer {client_addr}: {e}")
+            listener = self._make_listener(self.port)
+        except socket.error as e:
+            logger.warning("[Server] Worker not started: %s", e)
+            return
+        worker = ServerWorker(self, listener)
+        try:
+            worker.run()
         finally:
-            if peer_host:
-                self.remove_peer(peer_host, peer_port)
-            client_socket.close()
-            if peer_host and peer_port:
-                print(f"[Server] Connection closed for {peer_host}:{peer_port}")
-            else:
-                print(f"[Server] Connection closed for {client_addr}")
-    
-    def recv_message(self, sock):
-        data = b""
-        while True:
-            try:
-                chunk = sock.recv(4096)
-                if not chunk:
-                    return None
-                data += chunk
-                if b"\r\n\r\n" in data:
-                    break
-            except socket.error:
-                return None
-        return data.decode()
-    
-    def _peer_exists(self, hostname, port):
-        return any(h == hostname and p == port for h, p in self.peers)
-    
-    def _print_state(self):
-        """Print server state (call with lock held)."""
-        print("[Server] === Current State ===")
-        if self.peers:
-            print(f"[Server] Active Peers: {', '.join(f'{h}:{p}' for h, p in self.peers)}")
-        else:
-            print("[Server] Active Peers: (none)")
+            worker.close()
+    
+    def handle_request(self, conn, data):
+        """Handle one P2S request from a peer connection and return the encoded response."""
+        req = parse_p2s_request(data)
+        if not req:
+            return _RESP_400
         
-        if self.rfc_index:
-            print("[Server] RFC Index:")
-            for num, title, host, port in self.rfc_index:
-                print(f"[Server]   RFC {num} {title} ({host}:{port})")
-        else:
-            print("[Server] RFC Index: (empty)")
-        print("[Server] =========================")
+        if req['version'] != VERSION:
+            return _RESP_505
+        
+        peer_host = req['headers'].get('Host', conn['addr'][0])
+        peer_port = int(req['headers'].get('Port', 0))
+        
+        if conn['host'] is None:
+            logger.info("[Server] Connection from host %s at %s:%s",
+                        peer_host, conn['addr'][0], peer_port)
+            with self.lock:
+                new_peer = self._add_peer(peer_host, peer_port)
+                state = self._state_snapshot()
+            if new_peer:
+                logger.info("[Server] Added %s:%s", peer_host, peer_port)
+            if state:
+                logger.info("%s", _format_state(*state))
+        conn['host'], conn['port'] = peer_host, peer_port
+        
+        # Handle request
+        handler = self._dispatch.get(req['method'])
+        if handler is None:
+            return _RESP_400
+        return handler(req, peer_host, peer_port)
+    
+    def _add_peer(self, hostname, port):
+        """Record an active peer; return True if it was new (call with lock held)."""
+        if (hostname, port) in self.peers:
+            return False
+        self.peers[(hostname, port)] = None
+        return True
+    
+    def _state_snapshot(self):
+        """Copy the peers and records for a state dump (call with lock held).
+        
+        Returns None when INFO logging is off. Only references are copied
+        here; _format_state builds the text after the lock is released.
+        """
+        if not logger.isEnabledFor(logging.INFO):
+            return None
+        return list(self.peers), list(self.rfc_index.values())
+    
+    def _add_record(self, rfc_num, title, hostname, port):
+        """Index a new RFC record and return it (call with lock held)."""
+        line = f"RFC {rfc_num} {title} {hostname} {port}\r\n".encode()
+        record = RfcRecord(rfc_num, title, hostname, port, line)
+        record_id = next(self._record_ids)
+        self.rfc_index[record_id] = record
+        self.rfc_by_peer[(hostname, port)].append(record_id)
+        self.rfc_by_num[rfc_num] = (record,) + self.rfc_by_num.get(rfc_num, ())
+        self._list_response = None
+        return record
     
     def handle_add(self, req, hostname, port):
         rfc_num = req['rfc_number']
         title = req['headers'].get('Title', '')
         
         with self.lock:
-            if not self._peer_exists(hostname, port):
-                self.peers.insert(0, (hostname, port))
-                print(f"[Server] Added {hostname}:{port}")
-            
-            self.rfc_index.insert(0, (rfc_num, title, hostname, port))
-            print(f"[Server] Added RFC {rfc_num} from {hostname}:{port}")
-            self._print_state()
+            new_peer = self._add_peer(hostname, port)
+            record = self._add_record(rfc_num, title, hostname, port)
+            state = self._state_snapshot()
         
-        return build_p2s_response(200, [f"RFC {rfc_num} {title} {hostname} {port}"])
+        if new_peer:
+            logger.info("[Server] Added %s:%s", hostname, port)
+        logger.info("[Server] Added RFC %s from %s:%s", rfc_num, hostname, port)
+        if state:
+            logger.info("%s", _format_state(*state))
+        return build_p2s_response_bytes(200, (record.line,))
     
-    def handle_lookup(self, req):
-        rfc_num = req['rfc_number']
+    def handle_addmany(self, req, hostname, port):
+        items = req['items']
+        
         with self.lock:
-            matches = [f"RFC {n} {t} {h} {p}" 
-                      for n, t, h, p in self.rfc_index if n == rfc_num]
+            new_peer = self._add_peer(hostname, port)
+            lines = [self._add_record(rfc_num, title, hostname, port).line
+                     for rfc_num, title in items]
+            state = self._state_snapshot()
         
-        if matches:
-            return build_p2s_response(200, matches)
-        return build_p2s_response(404)
+        if state:
+            if new_peer:
+                logger.info("[Server] Added %s:%s", hostname, port)
+            logger.info("%s", "\n".join(f"[Server] Added RFC {rfc_num} from {hostname}:{port}"
+                                         for rfc_num, _ in items))
+            logger.info("%s", _format_state(*state))
+        return build_p2s_response_bytes(200, lines)
+    
+    def handle_lookup(self, req):
+        rfc_num = req['rfc_number']
+        records = self.rfc_by_num.get(rfc_num)
+        if records:
+            return build_p2s_response_bytes(200, [rec.line for rec in records])
+        return _RESP_404
     
     def handle_list(self):
-        with self.lock:
-            if not self.rfc_index:
-                return build_p2s_response(404)
-            lines = [f"RFC {n} {t} {h} {p}" for n, t, h, p in self.rfc_index]
-        return build_p2s_response(200, lines)
+        response = self._list_response
+        if response is None:
+            # Rebuilt at most once per change to the index
+            with self.lock:
+                if self._list_response is None:
+                    if self.rfc_index:
+                        self._list_response = build_p2s_response_bytes(
+                            200, [rec.line for rec in reversed(self.rfc_index.values())])
+                    else:
+                        self._list_response = _RESP_404
+                response = self._list_response
+        return response
     
     def remove_peer(self, hostname, port):
         with self.lock:
-            self.peers = [(h, p) for h, p in self.peers 
-                         if not (h == hostname and p == port)]
-            self.rfc_index = [(n, t, h, p) for n, t, h, p in self.rfc_index 
-                             if not (h == hostname and p == port)]
-            print(f"[Server] Removed peer {hostname}:{port} and associated RFCs")
-            self._print_state()
+            self.peers.pop((hostname, port), None)
+            removed = self.rfc_by_peer.pop((hostname, port), ())
+            for rfc_num in {self.rfc_index.pop(i).rfc_number for i in removed}:
+                records = tuple(rec for rec in self.rfc_by_num[rfc_num]
+                                if not (rec.hostname == hostname and rec.port == port))
+                if records:
+                    self.rfc_by_num[rfc_num] = records
+                else:
+                    del self.rfc_by_num[rfc_num]
+            if removed:
+                self._list_response = None
+            state = self._state_snapshot()
+        logger.info("[Server] Removed peer %s:%s and associated RFCs", hostname, port)
+        if state:
+            logger.info("%s", _format_state(*state))
+
+
+class ServerWorker:
+    """Event loop serving one listening socket of the CentralServer.
+    
+    A single thread multiplexes all of this listener's peer connections
+    with a selector (epoll on Linux), and answers their requests from the
+    shared index.
+    """
+    
+    def __init__(self, server, listener):
+        self.server = server
+        self.server_socket = listener
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(listener, selectors.EVENT_READ)
+        self.connections = {}   # fd -> per-connection state
+        self.recv_buf = bytearray(4096)   # scratch buffer shared by this loop's recvs
+    
+    def run(self):
+        while self.server.running:
+            for key, mask in self.selector.select(timeout=0.5):
+                sock = key.fileobj
+                if sock is self.server_socket:
+                    self._accept()
+                    continue
+                if mask & selectors.EVENT_WRITE:
+                    self._flush(sock)
+                if mask & selectors.EVENT_READ and sock.fileno() in self.connections:
+                    self._read(sock)
+    
+    def close(self):
+        for conn in list(self.connections.values()):
+            self._close(conn['sock'])
+        self.selector.close()
+        self.server_socket.close()
+    
+    def _accept(self):
+        while True:
+            try:
+                client_socket, addr = self.server_socket.accept()
+            except BlockingIOError:
+                return
+            client_socket.setblocking(False)
+            # Responses are small; send them without waiting on Nagle
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.connections[client_socket.fileno()] = {
+                'sock': client_socket,
+                'addr': addr,
+                'buf': bytearray(),   # request bytes received so far
+                'out': [],   # encoded responses (or their unsent tails)
+                'host': None,
+                'port': None,
+            }
+            self.selector.register(client_socket, selectors.EVENT_READ)
+    
+    def _close(self, sock):
+        """Drop a peer connection and every record registered over it."""
+        conn = self.connections.pop(sock.fileno())
+        self.selector.unregister(sock)
+        sock.close()
+        peer_host, peer_port = conn['host'], conn['port']
+        if peer_host:
+            self.server.remove_peer(peer_host, peer_port)
+        if peer_host and peer_port:
+            logger.info("[Server] Connection closed for %s:%s", peer_host, peer_port)
+        else:
+            logger.info("[Server] Connection closed for %s", conn['addr'])
+    
+    def _read(self, sock):
+        conn = self.connections[sock.fileno()]
+        try:
+            n = sock.recv_into(self.recv_buf)
+        except BlockingIOError:
+            return
+        except socket.error:
+            n = 0
+        if not n:
+            self._close(sock)
+            return
+        conn['buf'] += memoryview(self.recv_buf)[:n]
+        
+        # Answer every complete request in the buffer; a peer may send
+        # the next one before reading the previous response
+        try:
+            while True:
+                length = _request_length(conn['buf'])
+                if length < 0:
+                    break
+                # Decode straight from the buffer rather than a sliced copy
+                with memoryview(conn['buf']) as mv:
+                    data = str(mv[:length], 'utf-8')
+                del conn['buf'][:length]
+                conn['out'].append(self.server.handle_request(conn, data))
+        except Exception as e:
+            logger.warning("[Server] Error handling peer %s: %s", conn['addr'], e)
+            self._close(sock)
+            return
+        self._flush(sock)
+    
+    def _flush(self, sock):
+        """Send as much pending output as the socket takes without blocking.
+        
+        Pending responses are gathered into one sendmsg call where the
+        platform has it, so they are never concatenated in userspace.
+        """
+        conn = self.connections[sock.fileno()]
+        out = conn['out']
+        try:
+            while out:
+                if _HAS_SENDMSG:
+                    sent = sock.sendmsg(out[:_IOV_MAX])
+                else:
+                    sent = sock.send(out[0])
+                # Drop the fully sent responses and trim a partial one
+                done = 0
+                while done < len(out) and sent >= len(out[done]):
+                    sent -= len(out[done])
+                    done += 1
+                del out[:done]
+                if sent:
+                    out[0] = memoryview(out[0])[sent:]
+        except BlockingIOError:
+            pass
+        except socket.error:
+            self._close(sock)
+            return
+        # Only wait for writability while output is pending
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if out else 0)
+        if self.selector.get_key(sock).events != events:
+            self.selector.modify(sock, events)
 
 
 def main():
+    parser = argparse.ArgumentParser(description='P2P-CI Central Index Server')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='Log only errors, not each request and the server state')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO,
+                        format='%(message)s')
+    
     print("=" * 50)
     print("P2P-CI Central Index Server")
     print("=" * 50)
@@ -4,34 +4,52 @@ Simple-FTP Client (Sender) - Go-back-N ARQ
 Usage: python client.py <host> <port> <file> <window-size> <mss>
 """
 
+import select
 import socket
 import sys
 import time
 from packet import make_data_packet, parse_packet, is_ack, HEADER_SIZE
+from netbatch import BatchSender, SOCKET_BUFFER_SIZE
 
 TIMEOUT = 0.5  # seconds
 
+# Non-blocking recv flag for draining queued ACKs (not available on Windows)
+_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0)
+
 
 def create_packets(input_filename, max_segment_size):
     """Read file and segment into packets."""
     with open(input_filename, 'rb') as input_file:
         file_data = input_file.read()
     
-    packet_list = []
-    for offset in range(0, len(file_data), max_segment_size):
-        sequence_number = len(packet_list)
-        segment_data = file_data[offset:offset + max_segment_size]
-        packet_list.append(make_data_packet(sequence_number, segment_data))
+    # Slice segments as views of the file data instead of copies
+    file_view = memoryview(file_data)
+    packet_list = [make_data_packet(sequence_number, file_view[offset:offset + max_segment_size])
+                   for sequence_number, offset in enumerate(range(0, len(file_data), max_segment_size))]
     
     print("Loaded '{}': {} bytes, {} packets".format(input_filename, len(file_data), len(packet_list)))
     return packet_list
 
 
+def _drain_acks(client_socket):
+    """Yield the ACK that made the socket readable plus any queued behind it."""
+    yield client_socket.recv(HEADER_SIZE)
+    if not _DONTWAIT:
+        return
+    while True:
+        try:
+            yield client_socket.recv(HEADER_SIZE, _DONTWAIT)
+        except BlockingIOError:
+            return
+
+
 def send_file(server_host, server_port, packet_list, window_size):
     """Transfer packets using Go-back-N protocol."""
     client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    client_socket.settimeout(TIMEOUT)
+    client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
+    client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
     server_address = (server_host, server_port)
+    sender = BatchSender(client_socket, server_address, packet_list)
     
     window_base = 0                    # oldest unACKed sequence number
     next_sequence_number = 0           # next sequence number to send
@@ -42,33 +60,37 @@ def send_file(server_host, server_port, packet_list, window_size):
     transfer_start_time = time.time()
     
     while window_base < len(packet_list):
-        # Send packets within window
-        while next_sequence_number < window_base + window_size and next_sequence_number < len(packet_list):
-            client_socket.sendto(packet_list[next_sequence_number], server_address)
-            if next_sequence_number == window_base:
+        # Send every packet the window allows in one batch
+        window_end = min(window_base + window_size, len(packet_list))
+        if next_sequence_number < window_end:
+            if timer_start_time is None:
                 timer_start_time = time.time()
-            next_sequence_number += 1
+            sender.send(next_sequence_number, window_end)
+            next_sequence_number = window_end
         
-        # Wait for ACK
-        try:
-            ack_packet_data, _ = client_socket.recvfrom(HEADER_SIZE)
-            parsed_ack = parse_packet(ack_packet_data)
-            
-            if parsed_ack and is_ack(parsed_ack[2]):
-                acked_sequence_number = parsed_ack[0]
-                if acked_sequence_number >= window_base:
-                    window_base = acked_sequence_number + 1
-                    timer_start_time = time.time() if window_base < next_sequence_number else None
-        except socket.timeout:
-            pass
+        # Wait for ACKs, but no longer than the retransmission timer allows
+        remaining_time = TIMEOUT - (time.time() - timer_start_time)
+        readable, _, _ = select.select([client_socket], [], [], max(0, remaining_time))
+        if readable:
+            try:
+                for ack_packet_data in _drain_acks(client_socket):
+                    parsed_ack = parse_packet(ack_packet_data)
+                    if parsed_ack and is_ack(parsed_ack[2]):
+                        acked_sequence_number = parsed_ack[0]
+                        if acked_sequence_number >= window_base:
+                            window_base = acked_sequence_number + 1
+                            timer_start_time = time.time() if window_base < next_sequence_number else None
+            except ConnectionResetError:
+                # Windows reports an ICMP port unreachable this way; the
+                # packets are simply lost and will be retransmitted
+                pass
         
         # Handle timeout: retransmit all unACKed packets
         if timer_start_time and (time.time() - timer_start_time) >= TIMEOUT:
             print("Timeout, sequence number = {}".format(window_base))
             timer_start_time = time.time()
-            for sequence_number in range(window_base, next_sequence_number):
-                client_socket.sendto(packet_list[sequence_number], server_address)
-                retransmission_count += 1
+            sender.send(window_base, next_sequence_number)
+            retransmission_count += next_sequence_number - window_base
     
     total_transfer_time = time.time() - transfer_start_time
     print("\nDone! Time: {:.3f}s, Retransmissions: {}".format(total_transfer_time, retransmission_count))
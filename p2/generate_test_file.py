@@ -1,16 +1,36 @@
 """Generate a 1MB test file for Simple-FTP transfer testing."""
-import random
 import string
 import os
 
+try:
+    import numpy as np
+except ImportError:   # optional; fall back to bytes.translate below
+    np = None
+
 filename = "test_1mb.txt"
 size = 1024 * 1024  # 1 MB
 
 # Generate random readable text (letters, digits, spaces, newlines)
-chars = string.ascii_letters + string.digits + " " * 10 + "\n" * 2
-content = "".join(random.choice(chars) for _ in range(size))
+chars = (string.ascii_letters + string.digits + " " * 10 + "\n" * 2).encode()
+
+if np is not None:
+    # Draw every index in one call and gather the chars in one fancy-index
+    alphabet = np.frombuffer(chars, dtype=np.uint8)
+    rng = np.random.default_rng()
+    content = alphabet[rng.integers(0, alphabet.size, size=size, dtype=np.intp)].tobytes()
+else:
+    # Map random bytes onto chars with bytes.translate. Byte values past the last
+    # whole multiple of len(chars) are dropped so every char stays equally likely.
+    limit = 256 - 256 % len(chars)
+    table = bytes(chars[b % len(chars)] for b in range(256))
+    reject = bytes(range(limit, 256))
+    
+    content = bytearray()
+    while len(content) < size:
+        content += os.urandom(size).translate(table, reject)
+    del content[size:]
 
-with open(filename, "w") as f:
+with open(filename, "wb") as f:
     f.write(content)
 
 print(f"Created {filename}: {os.path.getsize(filename):,} bytes")
@@ -0,0 +1,206 @@
+"""
+Batched UDP I/O for Simple-FTP.
+
+On Linux a whole run of packets is handed to the kernel with one
+sendmmsg(2) call through ctypes. Elsewhere (or if libc lacks sendmmsg)
+the packets are sent one sendto() at a time.
+
+On the receive side, BatchReceiver returns every datagram already queued
+on the socket in one call, so the receiver handles a whole burst per wakeup. On
+Linux the burst is read with one recvmmsg(2) call; elsewhere it is
+drained with non-blocking recvfrom() calls.
+"""
+
+import ctypes
+import errno
+import os
+import select
+import socket
+import struct
+import sys
+
+# SO_SNDBUF/SO_RCVBUF for the client and server sockets: room for a whole
+# window in flight, so the kernel does not drop packets the loss
+# simulation never saw
+SOCKET_BUFFER_SIZE = 4 * 1024 * 1024  # bytes; the kernel may clamp this
+
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IOVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+def _load_libc_function(name, argtypes):
+    """Return libc's name() with the given argument types, or None if unavailable."""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        function = getattr(libc, name)
+    except (OSError, AttributeError):
+        return None
+    function.argtypes = argtypes
+    function.restype = ctypes.c_int
+    return function
+
+
+_sendmmsg = _load_libc_function(
+    'sendmmsg', [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int])
+_recvmmsg = _load_libc_function(
+    'recvmmsg', [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p])
+
+# Non-blocking recv flag for draining queued datagrams (not available on Windows)
+_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0)
+# recvmmsg flag: block for the first datagram only (Linux <sys/socket.h>)
+_MSG_WAITFORONE = 0x10000
+_SOCKADDR_IN_SIZE = 16
+
+
+class BatchSender:
+    """Sends ranges of a fixed list of packets to one IPv4 address.
+
+    The message headers for every packet are built once up front, so
+    sending packets[start:stop] costs one system call per batch and no
+    per-packet work in Python. Packets must be bytearrays (as returned by
+    make_data_packet) so the kernel can read them in place.
+    """
+
+    def __init__(self, sock, address, packet_list):
+        self.sock = sock
+        self.address = address
+        self.packet_list = packet_list
+        self.batched = _sendmmsg is not None and sock.family == socket.AF_INET
+        if not self.batched:
+            return
+
+        ip = socket.gethostbyname(address[0])
+        self._sockaddr = ctypes.create_string_buffer(
+            struct.pack('=HH4s8x', socket.AF_INET, socket.htons(address[1]), socket.inet_aton(ip)))
+        count = len(packet_list)
+        self._buffers = [(ctypes.c_char * len(p)).from_buffer(p) for p in packet_list]
+        self._iovecs = (_IOVec * count)()
+        self._msgs = (_MMsgHdr * count)()
+        for i, buf in enumerate(self._buffers):
+            self._iovecs[i].iov_base = ctypes.addressof(buf)
+            self._iovecs[i].iov_len = len(buf)
+            hdr = self._msgs[i].msg_hdr
+            hdr.msg_name = ctypes.addressof(self._sockaddr)
+            hdr.msg_namelen = len(self._sockaddr.raw)
+            hdr.msg_iov = ctypes.pointer(self._iovecs[i])
+            hdr.msg_iovlen = 1
+        self._fd = sock.fileno()
+        self._msg_size = ctypes.sizeof(_MMsgHdr)
+
+    def send(self, start, stop):
+        """Send packet_list[start:stop]."""
+        if not self.batched:
+            for sequence_number in range(start, stop):
+                self.sock.sendto(self.packet_list[sequence_number], self.address)
+            return
+
+        base = ctypes.addressof(self._msgs)
+        while start < stop:
+            msgs = ctypes.cast(base + start * self._msg_size, ctypes.POINTER(_MMsgHdr))
+            sent = _sendmmsg(self._fd, msgs, stop - start, 0)
+            if sent < 0:
+                err = ctypes.get_errno()
+                if err == errno.EINTR:
+                    continue
+                raise OSError(err, os.strerror(err))
+            start += sent
+
+
+class BatchReceiver:
+    """Receives bursts of datagrams from one socket.
+    
+    receive() waits for a datagram like recvfrom() (honouring the socket's
+    timeout), then takes up to count - 1 more that are already queued
+    without waiting. With recvmmsg the datagrams land in buffers allocated
+    once here, and the returned data are memoryviews into them that stay
+    valid only until the next receive().
+    """
+    
+    def __init__(self, sock, count=64, size=65535):
+        self.sock = sock
+        self.count = count if _DONTWAIT else 1
+        self.size = size
+        self.batched = _recvmmsg is not None and sock.family == socket.AF_INET
+        if not self.batched:
+            return
+        
+        self._buffer = bytearray(count * size)
+        self._views = [memoryview(self._buffer)[i * size:(i + 1) * size] for i in range(count)]
+        self._names = ctypes.create_string_buffer(count * _SOCKADDR_IN_SIZE)
+        self._names_view = memoryview(self._names)
+        self._last_name = None   # raw port + address of the last sender
+        self._last_address = None
+        self._cbuffer = (ctypes.c_char * len(self._buffer)).from_buffer(self._buffer)
+        base = ctypes.addressof(self._cbuffer)
+        self._iovecs = (_IOVec * count)()
+        self._msgs = (_MMsgHdr * count)()
+        for i in range(count):
+            self._iovecs[i].iov_base = base + i * size
+            self._iovecs[i].iov_len = size
+            hdr = self._msgs[i].msg_hdr
+            hdr.msg_name = ctypes.addressof(self._names) + i * _SOCKADDR_IN_SIZE
+            # The kernel writes back the sender's length, which for AF_INET
+            # is always this size, so it needs no reset between calls
+            hdr.msg_namelen = _SOCKADDR_IN_SIZE
+            hdr.msg_iov = ctypes.pointer(self._iovecs[i])
+            hdr.msg_iovlen = 1
+        self._fd = sock.fileno()
+    
+    def receive(self):
+        """Return a list of (data, address) pairs, oldest first."""
+        if not self.batched:
+            datagrams = [self.sock.recvfrom(self.size)]
+            while len(datagrams) < self.count:
+                try:
+                    datagrams.append(self.sock.recvfrom(self.size, _DONTWAIT))
+                except BlockingIOError:
+                    break
+            return datagrams
+        
+        flags = _MSG_WAITFORONE
+        timeout = self.sock.gettimeout()
+        if timeout is not None:
+            # A socket with a timeout is non-blocking underneath, so the
+            # wait happens in select() instead of in recvmmsg
+            if not select.select([self.sock], [], [], timeout)[0]:
+                raise socket.timeout('timed out')
+            flags = _DONTWAIT
+        while True:
+            received = _recvmmsg(self._fd, self._msgs, self.count, flags, None)
+            if received >= 0:
+                break
+            err = ctypes.get_errno()
+            if err == errno.EINTR:
+                continue
+            if err == errno.EAGAIN:
+                return []
+            raise OSError(err, os.strerror(err))
+        
+        datagrams = []
+        for i in range(received):
+            # Port and IPv4 address, both in network byte order
+            name = self._names_view[i * _SOCKADDR_IN_SIZE + 2:i * _SOCKADDR_IN_SIZE + 8]
+            if name != self._last_name:
+                self._last_name = bytes(name)
+                self._last_address = (socket.inet_ntoa(name[2:]), int.from_bytes(name[:2], 'big'))
+            datagrams.append((self._views[i][:self._msgs[i].msg_len], self._last_address))
+        return datagrams
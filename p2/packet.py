@@ -5,52 +5,150 @@ Data Packet: [seq_num: 4B] [checksum: 2B] [flags: 2B] [data: MSS bytes]
 ACK Packet:  [seq_num: 4B] [zeros: 2B]    [flags: 2B]
 """
 
+import os
 import struct
+import sys
+import zlib
+
+try:
+    import numpy as np
+except ImportError:   # optional; checksum() falls back to integer arithmetic
+    np = None
+
+try:
+    import numba
+except ImportError:   # optional; needs numpy too
+    numba = None
 
 DATA_FLAG = 0x5555  # 0101010101010101
 ACK_FLAG = 0xAAAA   # 1010101010101010
 HEADER_SIZE = 8
 
+# Checksum carried in the header: 'rfc1071' (Internet checksum, the
+# default) or 'adler32' (low 16 bits of zlib.adler32). Client and server
+# must use the same one; set SIMPLE_FTP_CHECKSUM to choose.
+CHECKSUM_ALGO = os.environ.get('SIMPLE_FTP_CHECKSUM', 'rfc1071')
+if CHECKSUM_ALGO not in ('rfc1071', 'adler32'):
+    raise ValueError("SIMPLE_FTP_CHECKSUM must be 'rfc1071' or 'adler32', not {!r}".format(CHECKSUM_ALGO))
+
+# Header layout, compiled once: seq_num, checksum (or zeros), flags
+_HEADER = struct.Struct('!IHH')
 
-def checksum(data):
-    """Compute Internet checksum (RFC 1071)."""
-    # Handle both Python 2 strings and Python 3 bytes
-    if isinstance(data, str):
-        data = bytearray(data)
+# Size tiers for checksum(): below these many bytes the big-integer sum
+# beats the call overhead of the Numba and NumPy versions
+_NUMBA_MIN_SIZE = 256
+_NUMPY_MIN_SIZE = 1024
+_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+def _checksum_int(data):
+    """Internet checksum (RFC 1071) using CPython's integer arithmetic."""
+    # Read the whole buffer as one big-endian integer. Since 2**16 == 1
+    # (mod 0xFFFF), it is congruent to the sum of its 16-bit words, and
+    # end-around carry folding computes exactly that sum mod 0xFFFF, giving
+    # 0xFFFF rather than 0 for a nonzero multiple.
+    value = int.from_bytes(data, 'big')
+    if len(data) % 2:
+        value <<= 8   # pad the odd last byte with zero
+    total = value % 0xFFFF
+    if total == 0 and value:
+        total = 0xFFFF
     
+    return ~total & 0xFFFF
+
+
+def _checksum_numpy(data):
+    """Internet checksum (RFC 1071), vectorized with NumPy for large buffers."""
+    if len(data) < _NUMPY_MIN_SIZE:
+        return _checksum_int(data)
     if len(data) % 2:
-        if isinstance(data, bytearray):
-            data.append(0)
-        else:
-            data += b'\x00'
+        # Pad a copy; data may be the caller's buffer or a memoryview
+        data = bytes(data) + b'\x00'
+    # Sum the 16-bit words in native byte order in one C loop, then fold
+    # the carries. One's-complement addition commutes with swapping the
+    # bytes of every word (RFC 1071 section 2(B)), so on a little-endian
+    # host the folded sum only needs its two bytes swapped back
+    total = int(np.frombuffer(data, dtype=np.uint16).sum(dtype=np.uint64))
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    if _LITTLE_ENDIAN:
+        total = ((total & 0xFF) << 8) | (total >> 8)
+    return ~total & 0xFFFF
+
+
+def _checksum_adler32(data):
+    """Low 16 bits of zlib's Adler-32 (used instead of RFC 1071 when selected)."""
+    return zlib.adler32(data) & 0xFFFF
+
+
+def _load_checksum_numba():
+    """JIT-compile the Numba checksum, or return None if Numba is missing."""
+    if numba is None or np is None:
+        return None
     
-    total = 0
-    for i in range(0, len(data), 2):
-        # Handle both bytes and bytearray
-        byte1 = data[i] if isinstance(data[i], int) else ord(data[i])
-        byte2 = data[i + 1] if isinstance(data[i + 1], int) else ord(data[i + 1])
-        total += (byte1 << 8) + byte2
-        total = (total & 0xFFFF) + (total >> 16)  # fold carry
+    @numba.njit(cache=True, boundscheck=False)
+    def checksum_nb(buf):
+        """JIT-compiled checksum of a uint8 array; an odd last byte is padded."""
+        total = 0
+        size = buf.size
+        for i in range(0, size - 1, 2):
+            total += (int(buf[i]) << 8) | int(buf[i + 1])
+        if size & 1:
+            total += int(buf[size - 1]) << 8
+        while total >> 16:
+            total = (total & 0xFFFF) + (total >> 16)
+        return ~total & 0xFFFF
     
-    return ~total & 0xFFFF
+    # Compile (or load from cache) now, for read-only (bytes) and writable
+    # (bytearray) buffers, so the first packet does not pay for it
+    checksum_nb(np.frombuffer(b'\x00', dtype=np.uint8))
+    checksum_nb(np.zeros(1, dtype=np.uint8))
+    
+    def _checksum_numba(data):
+        """Internet checksum (RFC 1071), JIT-compiled with Numba for large buffers."""
+        if len(data) < _NUMBA_MIN_SIZE:
+            return _checksum_int(data)
+        return checksum_nb(np.frombuffer(data, dtype=np.uint8))
+    
+    return _checksum_numba
+
+
+# Pick the implementation once, so each packet pays for no dispatch beyond
+# its size tier: Adler-32 if selected, else Numba, NumPy or plain integers
+if CHECKSUM_ALGO == 'adler32':
+    checksum = _checksum_adler32
+else:
+    checksum = _load_checksum_numba() or (_checksum_numpy if np is not None else _checksum_int)
 
 
 def make_data_packet(sequence_number, data):
-    """Create a data packet: header + payload."""
-    header = struct.pack('!IHH', sequence_number, checksum(data), DATA_FLAG)
-    return header + data
+    """Create a data packet: header + payload.
+    
+    data may be any bytes-like object (e.g. a memoryview slice of the file);
+    header and payload are written straight into one preallocated buffer.
+    """
+    packet = bytearray(HEADER_SIZE + len(data))
+    _HEADER.pack_into(packet, 0, sequence_number, checksum(data), DATA_FLAG)
+    packet[HEADER_SIZE:] = data
+    return packet
 
 
 def make_ack_packet(sequence_number):
     """Create an ACK packet."""
-    return struct.pack('!IHH', sequence_number, 0, ACK_FLAG)
+    return _HEADER.pack(sequence_number, 0, ACK_FLAG)
 
 
 def parse_packet(packet):
-    """Parse any packet. Returns (sequence_number, checksum_or_zero, flags, data) or None."""
+    """Parse any packet. Returns (sequence_number, checksum_or_zero, flags, data) or None.
+    
+    None means the packet is too short or its flags are neither DATA nor
+    ACK; such packets are rejected before their payload is sliced out.
+    """
     if len(packet) < HEADER_SIZE:
         return None
-    sequence_number, checksum_or_zero, flags = struct.unpack('!IHH', packet[:HEADER_SIZE])
+    sequence_number, checksum_or_zero, flags = _HEADER.unpack_from(packet)
+    if flags != DATA_FLAG and flags != ACK_FLAG:
+        return None
     return sequence_number, checksum_or_zero, flags, packet[HEADER_SIZE:]
 
 
@@ -7,47 +7,41 @@ Usage: python server.py <port> <output-file> <loss-probability>
 import socket
 import sys
 import random
-from packet import parse_packet, make_ack_packet, is_valid_data
+from netbatch import BatchReceiver, SOCKET_BUFFER_SIZE
+from server_core import process_burst
 
 
 def run_server(port, output_filename, loss_probability):
     """Receive file using Go-back-N protocol."""
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
     server_socket.bind(('', port))
+    receiver = BatchReceiver(server_socket)
+    # Callables bound to locals once, so the receive loop does not look
+    # them up as globals or attributes for every burst
+    receive = receiver.receive
+    sendto = server_socket.sendto
+    rand = random.random
     
     print("Listening on port {}, writing to '{}', loss={}".format(port, output_filename, loss_probability))
     
     expected_sequence_number = 0
     
-    with open(output_filename, 'wb') as output_file:
+    with open(output_filename, 'wb', buffering=1 << 20) as output_file:
+        write = output_file.write
         while True:
             try:
-                packet_data, client_address = server_socket.recvfrom(65535)
-                parsed_packet = parse_packet(packet_data)
-                if not parsed_packet:
-                    continue
+                # Handle every datagram already queued, then send the burst's ACKs:
+                # one per in-order packet, with repeated re-ACKs collapsed
+                expected_sequence_number, acks = process_burst(
+                    receive(), expected_sequence_number, loss_probability, rand, write)
                 
-                sequence_number, received_checksum, flags, payload = parsed_packet
-                
-                # Simulate packet loss
-                if random.random() <= loss_probability:
-                    print("Packet loss, sequence number = {}".format(sequence_number))
-                    continue
-                
-                # Validate packet
-                if not is_valid_data(sequence_number, received_checksum, flags, payload):
-                    continue
-                
-                if sequence_number == expected_sequence_number:
-                    # In-order: accept data, send ACK, advance
-                    output_file.write(payload)
+                if acks:
+                    # Hand the burst's data to the OS in one write before ACKing it
                     output_file.flush()
-                    server_socket.sendto(make_ack_packet(sequence_number), client_address)
-                    expected_sequence_number += 1
-                else:
-                    # Out-of-order: resend ACK for last correctly received packet
-                    if expected_sequence_number > 0:
-                        server_socket.sendto(make_ack_packet(expected_sequence_number - 1), client_address)
+                    for ack_packet, ack_address in acks:
+                        sendto(ack_packet, ack_address)
                     
             except KeyboardInterrupt:
                 print("\nShutting down...")
@@ -0,0 +1,10 @@
+# Cython typing overlay for server_core.py.
+# Build with `cythonize -3 -i server_core.py`; without a compiled module the
+# plain .py is used.
+
+cimport cython
+
+@cython.locals(sequence_number=object, received_checksum=object, flags=object,
+               parsed_packet=tuple, acks=list, last_ack=cython.longlong)
+cpdef tuple process_burst(list datagrams, long long expected_sequence_number,
+                          double loss_probability, object rand, object write)
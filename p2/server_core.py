@@ -0,0 +1,52 @@
+"""
+Per-packet receive logic shared by server.py and server_auto.py.
+
+Kept in its own module so it can be compiled with Cython (see
+server_core.pxd); without a compiled module the plain .py is used.
+"""
+
+from packet import parse_packet, is_valid_data, make_ack_packet
+
+
+def process_burst(datagrams, expected_sequence_number, loss_probability, rand, write):
+    """Handle one burst of datagrams for the Go-back-N receiver.
+    
+    Simulates loss with rand(), passes in-order payloads to write() and
+    drops everything else. Returns (expected_sequence_number, acks): acks
+    lists the (ack_packet, address) pairs to send, in order. Every in-order
+    packet gets its own ACK; an out-of-order one re-ACKs the last packet
+    received in order, unless that ACK is already the previous one queued.
+    """
+    parse = parse_packet
+    valid = is_valid_data
+    make_ack = make_ack_packet
+    acks = []
+    last_ack = -1   # sequence number of the last ACK queued in this burst
+    for packet_data, client_address in datagrams:
+        parsed_packet = parse(packet_data)
+        if not parsed_packet:
+            continue
+        
+        sequence_number, received_checksum, flags, payload = parsed_packet
+        
+        # Simulate packet loss
+        if rand() <= loss_probability:
+            print("Packet loss, sequence number = {}".format(sequence_number))
+            continue
+        
+        # Validate packet
+        if not valid(sequence_number, received_checksum, flags, payload):
+            continue
+        
+        if sequence_number == expected_sequence_number:
+            # In-order: accept data, ACK it, advance
+            write(payload)
+            acks.append((make_ack(sequence_number), client_address))
+            last_ack = expected_sequence_number
+            expected_sequence_number += 1
+        elif expected_sequence_number > 0 and last_ack != expected_sequence_number - 1:
+            # Out-of-order: resend ACK for last correctly received packet
+            last_ack = expected_sequence_number - 1
+            acks.append((make_ack(last_ack), client_address))
+    
+    return expected_sequence_number, acks
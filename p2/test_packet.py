@@ -0,0 +1,77 @@
+"""
+Checks every checksum implementation in packet.py against a plain RFC 1071 loop.
+
+Usage: python -m unittest test_packet
+"""
+
+import random
+import unittest
+
+import packet
+
+
+def reference_checksum(data):
+    """Internet checksum (RFC 1071), one 16-bit big-endian word at a time."""
+    data = bytes(data)
+    if len(data) % 2:
+        data += b'\x00'
+    total = 0
+    for i in range(0, len(data), 2):
+        total += (data[i] << 8) | data[i + 1]
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+def _implementations():
+    """(name, function) for each RFC 1071 checksum usable here."""
+    found = [('int', packet._checksum_int)]
+    if packet.np is not None:
+        found.append(('numpy', packet._checksum_numpy))
+    numba_checksum = packet._load_checksum_numba()
+    if numba_checksum is not None:
+        found.append(('numba', numba_checksum))
+    if packet.CHECKSUM_ALGO == 'rfc1071':
+        found.append(('checksum', packet.checksum))
+    return found
+
+
+class ChecksumTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = random.Random(573)
+        self.implementations = _implementations()
+
+    def check(self, data):
+        expected = reference_checksum(data)
+        # bytes, bytearray and memoryview all reach checksum() in practice
+        for wrap in (bytes, bytearray, memoryview):
+            for name, function in self.implementations:
+                with self.subTest(impl=name, type=wrap.__name__, size=len(data)):
+                    self.assertEqual(function(wrap(data)), expected)
+
+    def test_random_buffers(self):
+        # Sizes on both sides of the NumPy and Numba size tiers, odd and even
+        sizes = [self.rng.randrange(1, 4096) for _ in range(200)]
+        sizes += [0, 1, 2, 3, packet._NUMBA_MIN_SIZE - 1, packet._NUMBA_MIN_SIZE,
+                  packet._NUMPY_MIN_SIZE - 1, packet._NUMPY_MIN_SIZE,
+                  packet._NUMPY_MIN_SIZE + 1, 65507]
+        for size in sizes:
+            self.check(bytes(self.rng.getrandbits(8) for _ in range(size)))
+
+    def test_edge_values(self):
+        # All-ones words sum to 0xFFFF, the case plain modular reduction gets wrong
+        for size in (2, 3, 1024, 1025, 4096):
+            self.check(b'\xff' * size)
+            self.check(b'\x00' * size)
+            self.check(b'\xff\x00' * (size // 2))
+
+    def test_packet_round_trip(self):
+        payload = bytes(self.rng.getrandbits(8) for _ in range(1500))
+        parsed = packet.parse_packet(bytes(packet.make_data_packet(7, payload)))
+        self.assertIsNotNone(parsed)
+        self.assertTrue(packet.is_valid_data(*parsed))
+        self.assertEqual(parsed[3], payload)
+
+
+if __name__ == "__main__":
+    unittest.main()